@@ -1,6 +1,8 @@
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, render_template, request, jsonify, session, g
 import json
 import os
+import time
+import threading
 from datetime import datetime
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Flowable
@@ -8,23 +10,142 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 import io
 import base64
+import math
+from tree_analytics import FunnelAggregator
+from visa_model import Condition, load_rule_base
+from single_flight import SingleFlight, request_key
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-change-this-in-production'
 
+# Optional WebSocket transport for questionnaire sessions
+try:
+    from flask_sock import Sock
+    sock = Sock(app)
+except ImportError:
+    print("flask-sock not installed, WebSocket transport disabled")
+    sock = None
+
+# Question orderings accepted by VisaRuleEngine.get_next_questions
+QUESTION_STRATEGIES = ('static', 'information_gain')
+# Prior probability of a "Yes" answer for questions without a configured prior
+DEFAULT_PRIOR = 0.5
+# Priors are clamped away from 0/1 so a conclusion is only "decided" by real answers
+PRIOR_EPSILON = 0.01
+
+def _entropy(p):
+    """Binary entropy (in bits) of a probability"""
+    if p <= 0.0 or p >= 1.0:
+        return 0.0
+    return -(p * math.log2(p) + (1.0 - p) * math.log2(1.0 - p))
+
 class VisaRuleEngine:
-    def __init__(self, rules_file):
-        with open(rules_file, 'r', encoding='utf-8') as f:
-            self.data = json.load(f)
-        self.rules = self.data['rules']
-        self.questions = self.data['questions']
-        self.visa_types = self.data['visa_types']
+    def __init__(self, rules_file, priors=None):
+        rule_base = load_rule_base(rules_file)
+        self.rules = rule_base.rules
+        self.questions = rule_base.questions
+        self.visa_types = rule_base.visa_types
+
+        # Priors are keyed by question id: rules.json "priors" section, then overrides
+        self.priors = {}
+        self.set_priors(rule_base.priors)
+        if priors:
+            self.set_priors(priors)
+
+        self._build_lookup_tables()
+
+    def _build_lookup_tables(self):
+        """Precompute the condition lookup and the tables used by the information-gain ordering"""
+        # First question per condition, as the old linear scans returned
+        self._question_by_condition = {}
+        for q in self.questions:
+            self._question_by_condition.setdefault(q['condition_id'], q)
+
+        rules_by_conclusion = {}
+        for rule in self.rules:
+            rules_by_conclusion.setdefault(rule['conclusion'], []).append(rule)
+
+        def compile_condition(condition, expanding):
+            # Formulas are nested tuples: ('FACT', id), ('AND', children) or ('OR', children)
+            if isinstance(condition, str):
+                if condition in rules_by_conclusion and condition not in expanding:
+                    expanding = expanding | {condition}
+                    children = tuple(compile_condition(r['conditions'], expanding)
+                                     for r in rules_by_conclusion[condition])
+                    return children[0] if len(children) == 1 else ('OR', children)
+                return ('FACT', condition)
+            if isinstance(condition, Condition) and condition.type in ('AND', 'OR'):
+                children = tuple(compile_condition(c, expanding) for c in condition['conditions'])
+                return (condition['type'], children)
+            return ('OR', ())
+
+        def collect_facts(formula, found):
+            if formula[0] == 'FACT':
+                found.add(formula[1])
+            else:
+                for child in formula[1]:
+                    collect_facts(child, found)
+            return found
+
+        # Compiled formula for every visa conclusion that has a rule
+        self._conclusion_formulas = {
+            visa_type: compile_condition(visa_type, frozenset())
+            for visa_type in self.visa_types
+            if visa_type in rules_by_conclusion
+        }
+
+        # Inverted index: condition id -> visa conclusions it can influence
+        self._conclusions_by_condition = {}
+        for visa_type, formula in self._conclusion_formulas.items():
+            for condition in collect_facts(formula, set()):
+                self._conclusions_by_condition.setdefault(condition, []).append(visa_type)
+
+    def set_priors(self, priors):
+        """Set prior "Yes" probabilities, keyed by question id"""
+        for question_id, prior in priors.items():
+            self.priors[question_id] = min(max(float(prior), PRIOR_EPSILON), 1.0 - PRIOR_EPSILON)
+
+    def learn_priors(self, answer_log, smoothing=1.0):
+        """Learn priors from logged answer sets (e.g. /api/evaluate payloads)
+
+        Each entry maps question ids to answers. Yes-rates are Laplace smoothed
+        so rarely answered questions stay close to an even prior.
+        """
+        yes_counts = {}
+        totals = {}
+        for answers in answer_log:
+            for question_id, answer in answers.items():
+                totals[question_id] = totals.get(question_id, 0) + 1
+                if answer is True or answer == 'yes':
+                    yes_counts[question_id] = yes_counts.get(question_id, 0) + 1
+
+        learned = {
+            question_id: (yes_counts.get(question_id, 0) + smoothing) / (total + 2 * smoothing)
+            for question_id, total in totals.items()
+        }
+        self.set_priors(learned)
+        return learned
+
+    def _formula_probability(self, formula, probabilities):
+        """Probability that a compiled formula holds, assuming independent facts"""
+        kind, operand = formula
+        if kind == 'FACT':
+            return probabilities.get(operand, 0.0)
+        if kind == 'AND':
+            result = 1.0
+            for child in operand:
+                result *= self._formula_probability(child, probabilities)
+            return result
+        remaining = 1.0
+        for child in operand:
+            remaining *= 1.0 - self._formula_probability(child, probabilities)
+        return 1.0 - remaining
 
     def evaluate_condition(self, condition, facts):
         """Evaluate a single condition against facts"""
         if isinstance(condition, str):
             return facts.get(condition, False)
-        elif isinstance(condition, dict):
+        elif isinstance(condition, Condition):
             if condition['type'] == 'AND':
                 return all(self.evaluate_condition(c, facts) for c in condition['conditions'])
             elif condition['type'] == 'OR':
@@ -70,7 +191,7 @@ class VisaRuleEngine:
                 if visa_rule:
                     required_conditions = self._get_all_conditions_for_visa(visa_type)
                     for condition in required_conditions:
-                        question = next((q for q in self.questions if q['condition_id'] == condition), None)
+                        question = self._question_by_condition.get(condition)
                         if question:
                             if user_answers.get(question['id']):
                                 satisfied_conditions.append({
@@ -107,7 +228,7 @@ class VisaRuleEngine:
         def collect_conditions(rule_conclusion):
             rule = next((r for r in self.rules if r['conclusion'] == rule_conclusion), None)
             if rule:
-                if isinstance(rule['conditions'], dict):
+                if isinstance(rule['conditions'], Condition):
                     for condition in rule['conditions']['conditions']:
                         if isinstance(condition, str):
                             # Check if this condition is itself a conclusion of another rule
@@ -120,8 +241,18 @@ class VisaRuleEngine:
         collect_conditions(visa_type)
         return list(conditions)
 
-    def get_next_questions(self, answered_questions, visa_types_filter=None):
-        """Get all unanswered questions in order, optionally filtered by visa types"""
+    def get_next_questions(self, answered_questions, visa_types_filter=None,
+                           strategy='static', answers=None):
+        """Get all unanswered questions in order, optionally filtered by visa types
+
+        strategy='static' keeps the rules.json order. strategy='information_gain'
+        asks screening questions first, then orders the rest by expected
+        information gain over the undecided visa conclusions, dropping
+        questions whose answer can no longer change any conclusion.
+        """
+        if strategy not in QUESTION_STRATEGIES:
+            raise ValueError(f"Unknown question strategy: {strategy}")
+
         answered_set = set(answered_questions)
         unanswered = [q for q in self.questions if q['id'] not in answered_set]
 
@@ -142,9 +273,59 @@ class VisaRuleEngine:
                     filtered.append(q)
             unanswered = filtered
 
+        if strategy == 'information_gain':
+            unanswered = self._order_by_information_gain(unanswered, answered_set, answers or {})
+
         # Return all unanswered questions
         return unanswered
 
+    def _order_by_information_gain(self, questions, answered_set, answers):
+        """Order questions by expected information gain over undecided visas"""
+        # Fact probabilities: answered questions are certain, the rest use priors
+        probabilities = {}
+        for question in self.questions:
+            question_id = question['id']
+            if question_id in answered_set:
+                answer = answers.get(question_id)
+                probabilities[question['condition_id']] = 1.0 if answer else 0.0
+            else:
+                probabilities[question['condition_id']] = self.priors.get(question_id, DEFAULT_PRIOR)
+
+        conclusion_probabilities = {
+            visa_type: self._formula_probability(formula, probabilities)
+            for visa_type, formula in self._conclusion_formulas.items()
+        }
+
+        screening = []
+        scored = []
+        for index, question in enumerate(questions):
+            if question.get('is_screening', False):
+                screening.append(question)
+                continue
+
+            condition = question['condition_id']
+            prior = probabilities[condition]
+            gain = 0.0
+
+            # Only the conclusions that mention this condition need re-evaluation
+            for visa_type in self._conclusions_by_condition.get(condition, ()):
+                current = conclusion_probabilities[visa_type]
+                if current <= 0.0 or current >= 1.0:
+                    continue  # Already decided
+                formula = self._conclusion_formulas[visa_type]
+                probabilities[condition] = 1.0
+                if_yes = self._formula_probability(formula, probabilities)
+                probabilities[condition] = 0.0
+                if_no = self._formula_probability(formula, probabilities)
+                probabilities[condition] = prior
+                gain += _entropy(current) - prior * _entropy(if_yes) - (1.0 - prior) * _entropy(if_no)
+
+            if gain > 1e-12:
+                scored.append((-gain, index, question))
+
+        scored.sort(key=lambda item: (item[0], item[1]))
+        return screening + [question for _, _, question in scored]
+
 # Initialize the rule engines
 # Use multi-visa engine
 try:
@@ -155,6 +336,12 @@ except Exception as e:
     print(f"Error loading multi_visa_engine: {e}")
     multi_visa_engine = None
 
+# Per-node funnel analytics for the decision trees
+funnel_analytics = FunnelAggregator(os.environ.get('FUNNEL_ANALYTICS_FILE', 'funnel_analytics.jsonl'))
+
+# Coalesces identical concurrent evaluations and exports within a worker
+coalescer = SingleFlight(timeout=float(os.environ.get('COALESCE_TIMEOUT', '30')))
+
 # Fallback to original rules engine
 try:
     rule_engine = VisaRuleEngine('rules.json')
@@ -179,10 +366,22 @@ def get_questions():
         answered_list = [a for a in answered.split(',') if a] if answered else []
         visa_types = request.args.get('visa_types', '')
         visa_types_list = [v for v in visa_types.split(',') if v] if visa_types else []
+        strategy = request.args.get('strategy', 'static')
+        if strategy not in QUESTION_STRATEGIES:
+            return jsonify({
+                'error': f"strategy must be one of: {', '.join(QUESTION_STRATEGIES)}",
+                'questions': [],
+                'total_questions': 0,
+                'answered_count': 0
+            }), 400
+        yes = request.args.get('yes', '')
+        yes_set = {a for a in yes.split(',') if a}
+        answers = {question_id: question_id in yes_set for question_id in answered_list}
 
-        print(f"[API] Getting questions - answered: {len(answered_list)}, visa_types: {visa_types_list}")
+        print(f"[API] Getting questions - answered: {len(answered_list)}, visa_types: {visa_types_list}, strategy: {strategy}")
 
-        next_questions = rule_engine.get_next_questions(answered_list, visa_types_list)
+        next_questions = rule_engine.get_next_questions(answered_list, visa_types_list,
+                                                        strategy=strategy, answers=answers)
         print(f"[API] Returning {len(next_questions)} questions")
 
         # Calculate total questions based on visa type filter
@@ -195,7 +394,7 @@ def get_questions():
             total_questions = len(rule_engine.questions)
 
         return jsonify({
-            'questions': next_questions[:1],  # Return 1 question at a time
+            'questions': [q.as_dict() for q in next_questions[:1]],  # Return 1 question at a time
             'total_questions': total_questions,
             'answered_count': len(answered_list)
         })
@@ -221,7 +420,8 @@ def evaluate_visa():
     # Store answers in session
     session['user_answers'] = user_answers
 
-    applicable_visas, facts = rule_engine.get_applicable_visas(user_answers)
+    key = request_key('evaluate', user_answers)
+    applicable_visas, facts = coalescer.do(key, lambda: rule_engine.get_applicable_visas(user_answers))
 
     return jsonify({
         'applicable_visas': applicable_visas,
@@ -230,95 +430,101 @@ def evaluate_visa():
         'evaluation_date': datetime.now().isoformat()
     })
 
-@app.route('/api/export/pdf', methods=['POST'])
-def export_pdf():
-    """Export visa evaluation results as PDF"""
-    try:
-        data = request.json
-        applicable_visas = data.get('applicable_visas', [])
-        user_info = data.get('user_info', {})
-
-        # Create PDF in memory
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4)
-
-        # Define styles
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=20,
-            spaceAfter=30,
-            alignment=1  # Center alignment
-        )
-
-        heading_style = ParagraphStyle(
-            'CustomHeading',
-            parent=styles['Heading2'],
-            fontSize=14,
-            spaceAfter=12,
-            textColor='#2c3e50'
-        )
-
-        # Build PDF content
-        story = []
-
-        # Title
-        story.append(Paragraph("米国ビザ評価結果", title_style))
-        story.append(Spacer(1, 12))
-
-        # Date
-        story.append(Paragraph(f"評価日: {datetime.now().strftime('%Y年%m月%d日')}", styles['Normal']))
+def build_evaluation_pdf(applicable_visas, user_info):
+    """Render visa evaluation results as a base64 encoded PDF"""
+    # Create PDF in memory
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+
+    # Define styles
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=20,
+        spaceAfter=30,
+        alignment=1  # Center alignment
+    )
+
+    heading_style = ParagraphStyle(
+        'CustomHeading',
+        parent=styles['Heading2'],
+        fontSize=14,
+        spaceAfter=12,
+        textColor='#2c3e50'
+    )
+
+    # Build PDF content
+    story = []
+
+    # Title
+    story.append(Paragraph("米国ビザ評価結果", title_style))
+    story.append(Spacer(1, 12))
+
+    # Date
+    story.append(Paragraph(f"評価日: {datetime.now().strftime('%Y年%m月%d日')}", styles['Normal']))
+    story.append(Spacer(1, 20))
+
+    # User information (if provided)
+    if user_info:
+        story.append(Paragraph("申請者情報:", heading_style))
+        for key, value in user_info.items():
+            story.append(Paragraph(f"{key}: {value}", styles['Normal']))
         story.append(Spacer(1, 20))
 
-        # User information (if provided)
-        if user_info:
-            story.append(Paragraph("申請者情報:", heading_style))
-            for key, value in user_info.items():
-                story.append(Paragraph(f"{key}: {value}", styles['Normal']))
-            story.append(Spacer(1, 20))
+    # Visa recommendations
+    story.append(Paragraph("推奨ビザタイプ:", heading_style))
 
-        # Visa recommendations
-        story.append(Paragraph("推奨ビザタイプ:", heading_style))
+    if applicable_visas:
+        for i, visa in enumerate(applicable_visas, 1):
+            confidence_percent = int(visa['confidence'] * 100)
+            story.append(Paragraph(f"{i}. {visa['name']} (適合度: {confidence_percent}%)", styles['Heading3']))
+            story.append(Paragraph(visa['description'], styles['Normal']))
 
-        if applicable_visas:
-            for i, visa in enumerate(applicable_visas, 1):
-                confidence_percent = int(visa['confidence'] * 100)
-                story.append(Paragraph(f"{i}. {visa['name']} (適合度: {confidence_percent}%)", styles['Heading3']))
-                story.append(Paragraph(visa['description'], styles['Normal']))
+            if visa['satisfied_conditions']:
+                story.append(Paragraph("満たされた要件:", styles['Heading4']))
+                for condition in visa['satisfied_conditions']:
+                    story.append(Paragraph(f"• {condition['question']}", styles['Normal']))
 
-                if visa['satisfied_conditions']:
-                    story.append(Paragraph("満たされた要件:", styles['Heading4']))
-                    for condition in visa['satisfied_conditions']:
-                        story.append(Paragraph(f"• {condition['question']}", styles['Normal']))
+            if visa['missing_conditions']:
+                story.append(Paragraph("不足している要件:", styles['Heading4']))
+                for condition in visa['missing_conditions']:
+                    story.append(Paragraph(f"• {condition['question']}", styles['Normal']))
 
-                if visa['missing_conditions']:
-                    story.append(Paragraph("不足している要件:", styles['Heading4']))
-                    for condition in visa['missing_conditions']:
-                        story.append(Paragraph(f"• {condition['question']}", styles['Normal']))
+            story.append(Spacer(1, 20))
+    else:
+        story.append(Paragraph("提供された情報に基づいて適切なビザタイプが見つかりませんでした。", styles['Normal']))
 
-                story.append(Spacer(1, 20))
-        else:
-            story.append(Paragraph("提供された情報に基づいて適切なビザタイプが見つかりませんでした。", styles['Normal']))
+    # Disclaimer
+    story.append(Spacer(1, 30))
+    story.append(Paragraph("免責事項:", heading_style))
+    story.append(Paragraph(
+        "この評価は情報提供のみを目的としており、法的助言を構成するものではありません。"
+        "正式なガイダンスについては、移民弁護士または公式機関にご相談ください。",
+        styles['Normal']
+    ))
 
-        # Disclaimer
-        story.append(Spacer(1, 30))
-        story.append(Paragraph("免責事項:", heading_style))
-        story.append(Paragraph(
-            "この評価は情報提供のみを目的としており、法的助言を構成するものではありません。"
-            "正式なガイダンスについては、移民弁護士または公式機関にご相談ください。",
-            styles['Normal']
-        ))
+    # Build PDF
+    doc.build(story)
 
-        # Build PDF
-        doc.build(story)
+    # Get PDF bytes
+    pdf_bytes = buffer.getvalue()
+    buffer.close()
 
-        # Get PDF bytes
-        pdf_bytes = buffer.getvalue()
-        buffer.close()
+    # Return base64 encoded PDF
+    return base64.b64encode(pdf_bytes).decode('utf-8')
+
+@app.route('/api/export/pdf', methods=['POST'])
+def export_pdf():
+    """Export visa evaluation results as PDF"""
+    try:
+        data = request.json
+        applicable_visas = data.get('applicable_visas', [])
+        user_info = data.get('user_info', {})
 
-        # Return base64 encoded PDF
-        pdf_base64 = base64.b64encode(pdf_bytes).decode('utf-8')
+        # Identical concurrent exports share one ReportLab build
+        key = request_key('pdf', {'applicable_visas': applicable_visas, 'user_info': user_info})
+        pdf_base64 = coalescer.do(key, lambda: build_evaluation_pdf(applicable_visas, user_info))
 
         return jsonify({
             'success': True,
@@ -338,6 +544,15 @@ def clear_session():
     session.clear()
     return jsonify({'success': True})
 
+@app.route('/api/metrics/coalescing')
+def coalescing_metrics():
+    """Request coalescing counters for this worker"""
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'metrics': coalescer.stats()
+    })
+
 @app.route('/api/visa/question')
 def get_visa_question():
     """Get current visa question based on visa type"""
@@ -351,6 +566,11 @@ def get_visa_question():
 
         print(f"[{visa_type}-VISA] Getting question for node: {current_node}")
 
+        # First view of this assessment starts the funnel and the node timer
+        if f'{visa_type}_entered_at' not in session:
+            session[f'{visa_type}_entered_at'] = time.time()
+            funnel_analytics.record_start(visa_type, current_node)
+
         # Get the question or result
         question_data = engine.get_current_question(current_node, answers)
 
@@ -404,6 +624,16 @@ def submit_visa_answer():
             # Get the next question or result
             next_data = engine.get_current_question(next_node, answers)
 
+            # Record the transition with the time spent on the answered node
+            now = time.time()
+            entered_at = session.get(f'{visa_type}_entered_at')
+            session[f'{visa_type}_entered_at'] = now
+            funnel_analytics.record_transition(
+                visa_type, node_id, answer, next_node,
+                seconds=now - entered_at if entered_at else None,
+                is_result=bool(next_data) and next_data['type'] == 'result'
+            )
+
             return jsonify({
                 'success': True,
                 'next_node': next_node,
@@ -435,6 +665,74 @@ def reset_visa():
     session.pop(f'{visa_type}_current_node', None)
     session.pop(f'{visa_type}_answers', None)
     session.pop(f'{visa_type}_path', None)
+    session.pop(f'{visa_type}_entered_at', None)
+    return jsonify({'success': True})
+
+@app.route('/api/visa/combined')
+def get_combined_questions():
+    """Get the questions still needed to evaluate several visa types at once"""
+    try:
+        types = request.args.get('types', '')
+        types_list = [t for t in types.split(',') if t] or None
+        answers = session.get('combined_answers', {})
+
+        combined = multi_visa_engine.evaluate_combined(answers, types_list)
+
+        return jsonify({
+            'success': True,
+            'data': combined
+        })
+
+    except Exception as e:
+        import traceback
+        print(f"[ERROR] in get_combined_questions: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/visa/combined/answer', methods=['POST'])
+def submit_combined_answers():
+    """Submit answers to one or more shared facts and get the remaining questions"""
+    try:
+        types = request.args.get('types', '')
+        types_list = [t for t in types.split(',') if t] or None
+        new_answers = request.json.get('answers', {})
+
+        unknown = [fact_id for fact_id in new_answers if fact_id not in multi_visa_engine.fact_nodes]
+        if unknown:
+            return jsonify({
+                'success': False,
+                'error': f"Unknown facts: {', '.join(unknown)}"
+            }), 400
+
+        print(f"[COMBINED] Answers submitted: {new_answers}")
+
+        answers = session.get('combined_answers', {})
+        answers.update(new_answers)
+        session['combined_answers'] = answers
+
+        combined = multi_visa_engine.evaluate_combined(answers, types_list)
+
+        return jsonify({
+            'success': True,
+            'data': combined
+        })
+
+    except Exception as e:
+        import traceback
+        print(f"[ERROR] in submit_combined_answers: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/visa/combined/reset', methods=['POST'])
+def reset_combined():
+    """Reset the combined visa assessment"""
+    session.pop('combined_answers', None)
     return jsonify({'success': True})
 
 @app.route('/api/visa/knowledge')
@@ -445,10 +743,10 @@ def get_visa_knowledge():
         engine = multi_visa_engine.get_engine(visa_type)
 
         # Return the full knowledge structure
-        knowledge = {
-            'visa_type': engine.visa_type,
-            'decision_tree': engine.decision_tree
-        }
+        knowledge = coalescer.do(request_key('knowledge', visa_type), lambda: {
+            'visa_type': engine.visa_type.as_dict(),
+            'decision_tree': engine.decision_tree.as_dict()
+        })
 
         return jsonify({
             'success': True,
@@ -464,6 +762,182 @@ def get_visa_knowledge():
             'error': str(e)
         }), 500
 
+@app.route('/api/visa/knowledge/subtree')
+def get_visa_knowledge_subtree():
+    """Get one page of a decision tree below a node, for on-demand expansion"""
+    try:
+        visa_type = request.args.get('type', 'E')
+        root_id = request.args.get('root') or None
+        try:
+            max_depth = min(max(int(request.args.get('depth', 2)), 0), 50)
+            cursor = max(int(request.args.get('cursor') or 0), 0)
+            limit = min(max(int(request.args.get('limit', 100)), 1), 500)
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'depth, cursor and limit must be integers'
+            }), 400
+
+        engine = multi_visa_engine.get_engine(visa_type)
+        subtree = engine.get_subtree(root_id, max_depth, cursor, limit)
+        if subtree is None:
+            return jsonify({
+                'success': False,
+                'error': f"Unknown node: {root_id}"
+            }), 404
+
+        # Visa information is only needed with the first page
+        if cursor == 0:
+            subtree['visa_type'] = engine.visa_type.as_dict()
+
+        return jsonify({
+            'success': True,
+            'subtree': subtree
+        })
+
+    except Exception as e:
+        import traceback
+        print(f"[ERROR] in get_visa_knowledge_subtree: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/visa/knowledge/search')
+def search_visa_knowledge():
+    """Search a decision tree's question text"""
+    try:
+        visa_type = request.args.get('type', 'E')
+        query = request.args.get('q', '')
+        try:
+            limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'limit must be an integer'
+            }), 400
+
+        engine = multi_visa_engine.get_engine(visa_type)
+
+        return jsonify({
+            'success': True,
+            'results': engine.search_questions(query, limit)
+        })
+
+    except Exception as e:
+        import traceback
+        print(f"[ERROR] in search_visa_knowledge: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+if sock is not None:
+    # Each open socket holds a server thread (a gthread thread under
+    # gunicorn.conf.py), so sockets get a budget below the thread count and
+    # an idle cutoff; HTTP requests always keep the remaining threads.
+    WS_MAX_CONNECTIONS = int(os.environ.get('WS_MAX_CONNECTIONS', '8'))
+    WS_IDLE_TIMEOUT = float(os.environ.get('WS_IDLE_TIMEOUT', '120'))
+    socket_slots = threading.BoundedSemaphore(WS_MAX_CONNECTIONS)
+
+    @app.before_request
+    def reserve_socket_slot():
+        """Refuse /ws/visa before the upgrade when all socket slots are taken
+
+        A plain 503 fails the browser's handshake (onerror), so the client
+        goes straight to HTTP instead of seeing an open socket close.
+        """
+        if request.path != '/ws/visa':
+            return None
+        if not socket_slots.acquire(blocking=False):
+            return jsonify({'error': 'Too many open WebSocket sessions'}), 503
+        g.socket_slot = True
+        return None
+
+    @app.teardown_request
+    def release_socket_slot(exc=None):
+        if g.pop('socket_slot', False):
+            socket_slots.release()
+
+    @sock.route('/ws/visa')
+    def visa_socket(ws):
+        """Serve a decision tree session over one WebSocket connection
+
+        Engine state (current node, answers, path) lives in this handler for
+        the life of the connection.
+        Upstream frames: {"op": "start", "type": "E"} and
+        {"op": "answer", "node_id": ..., "answer": ...}.
+        Downstream frames: {"node": ..., "data": ..., "path": [...]} or {"error": ...}.
+        The server closes the socket once a result is sent or after
+        WS_IDLE_TIMEOUT seconds without a frame. The slot is reserved by
+        reserve_socket_slot and released when the request tears down.
+        """
+        engine = None
+        visa_type = None
+        current_node = None
+        answers = {}
+        path = []
+        entered_at = None
+
+        while True:
+            message = ws.receive(timeout=WS_IDLE_TIMEOUT)
+            if message is None:
+                break
+
+            finished = False
+            try:
+                frame = json.loads(message)
+                op = frame.get('op')
+
+                if op == 'start':
+                    visa_type = frame.get('type', 'E')
+                    engine = multi_visa_engine.get_engine(visa_type)
+                    current_node = engine.decision_tree['root']
+                    answers = {}
+                    path = [current_node]
+                    entered_at = time.time()
+                    funnel_analytics.record_start(visa_type, current_node)
+                    reply = {'node': current_node, 'data': engine.get_current_question(current_node),
+                             'path': path}
+
+                elif op == 'answer':
+                    if engine is None:
+                        raise ValueError('Session not started')
+                    node_id = frame.get('node_id')
+                    if node_id != current_node:
+                        raise ValueError(f"Answer is for {node_id}, current node is {current_node}")
+                    answer = frame.get('answer')
+                    next_node = engine.get_next_node(node_id, answer)
+                    if not next_node:
+                        raise ValueError('No next node found')
+
+                    answers[node_id] = answer
+                    path.append(next_node)
+                    next_data = engine.get_current_question(next_node, answers)
+                    finished = bool(next_data) and next_data['type'] == 'result'
+                    now = time.time()
+                    funnel_analytics.record_transition(
+                        visa_type, node_id, answer, next_node,
+                        seconds=now - entered_at,
+                        is_result=finished
+                    )
+                    current_node = next_node
+                    entered_at = now
+                    reply = {'node': next_node, 'data': next_data, 'path': path}
+
+                else:
+                    raise ValueError(f"Unknown op: {op}")
+
+            except Exception as e:
+                print(f"[ERROR] in visa_socket: {str(e)}")
+                reply = {'error': str(e)}
+
+            ws.send(json.dumps(reply, ensure_ascii=False, separators=(',', ':')))
+            if finished:
+                break
+
 if __name__ == '__main__':
     import os
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,156 @@
+"""
+ASGI Serving Mode
+Serves the same Flask app (every /api/* endpoint) from an asyncio event loop.
+
+The event loop reads request bodies and writes responses, so slow clients
+cost a coroutine instead of a worker thread. The Flask view itself
+(session cookie decoding, engine evaluation) runs in a thread pool, and
+ReportLab PDF exports get their own smaller pool so they cannot starve the
+questionnaire endpoints. Sessions are signed cookies, so there is no
+session store I/O to block on.
+
+Run with uvicorn:
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT --workers 4
+or with the factory and custom pool sizes:
+    ASGI_THREADS=32 ASGI_PDF_THREADS=4 uvicorn --factory asgi:create_app
+
+uvicorn workers are spawned, not forked, so the gunicorn --preload memory
+sharing (gunicorn.conf.py) does not apply here. The /ws/visa WebSocket
+endpoint is only available under gunicorn.
+"""
+
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app as flask_app
+
+# Endpoints whose work is dominated by ReportLab
+PDF_PATHS = ('/api/export/pdf',)
+MAX_BODY_SIZE = 10 * 1024 * 1024
+
+
+def _build_environ(scope, body):
+    """Translate an ASGI HTTP scope into a WSGI environ"""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            key = 'CONTENT_TYPE'
+        elif name == 'CONTENT_LENGTH':
+            key = 'CONTENT_LENGTH'
+        else:
+            key = f'HTTP_{name}'
+        if key in environ:
+            separator = '; ' if key == 'HTTP_COOKIE' else ','
+            value = environ[key] + separator + value
+        environ[key] = value
+
+    # The body is fully buffered, so its length is known even for chunked uploads
+    environ['CONTENT_LENGTH'] = str(len(body))
+    return environ
+
+
+def _call_wsgi(wsgi_app, environ):
+    """Run the WSGI app to completion and return status, headers and body"""
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                               for name, value in headers]
+        return lambda data: None
+
+    result = wsgi_app(environ, start_response)
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], body
+
+
+def create_app(wsgi_app=None, threads=None, pdf_threads=None):
+    """ASGI app factory serving the Flask app through bounded thread pools"""
+    wsgi_app = wsgi_app or flask_app
+    executor = ThreadPoolExecutor(
+        max_workers=threads or int(os.environ.get('ASGI_THREADS', '16')),
+        thread_name_prefix='asgi-view')
+    pdf_executor = ThreadPoolExecutor(
+        max_workers=pdf_threads or int(os.environ.get('ASGI_PDF_THREADS', '2')),
+        thread_name_prefix='asgi-pdf')
+
+    async def lifespan(receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                executor.shutdown(wait=False)
+                pdf_executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def send_response(send, status, headers, body):
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def asgi_app(scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await lifespan(receive, send)
+            return
+
+        if scope['type'] == 'websocket':
+            await receive()
+            await send({'type': 'websocket.close', 'code': 1003})
+            return
+
+        # Read the whole body on the event loop; slow uploads don't hold a thread
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > MAX_BODY_SIZE:
+                await send_response(send, 413, [(b'content-type', b'text/plain')], b'Request body too large')
+                return
+            chunks.append(chunk)
+            if not message.get('more_body', False):
+                break
+
+        environ = _build_environ(scope, b''.join(chunks))
+        pool = pdf_executor if scope['path'] in PDF_PATHS else executor
+        loop = asyncio.get_running_loop()
+        status, headers, body = await loop.run_in_executor(pool, _call_wsgi, wsgi_app, environ)
+        await send_response(send, status, headers, body)
+
+    return asgi_app
+
+
+app = create_app()
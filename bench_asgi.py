@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark: ASGI serving mode vs the gunicorn deployment
+
+Starts each server on a local port with one worker, then runs many
+concurrent clients against /api/visa/question (with every tenth request
+a PDF export) while a set of slow clients trickle request bodies for the
+whole run. Reports throughput and latency for the normal clients.
+
+Servers compared:
+    gunicorn sync     gunicorn app:app (the original deployment)
+    gunicorn gthread  gunicorn -c gunicorn.conf.py app:app (render.yaml)
+    uvicorn asgi      uvicorn asgi:app
+
+Usage:
+    python bench_asgi.py [--concurrency 64] [--slow-clients 32] [--duration 10]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+SERVERS = {
+    'gunicorn sync': ['gunicorn', '--workers', '1', '--bind', '127.0.0.1:{port}', 'app:app'],
+    'gunicorn gthread': ['gunicorn', '-c', 'gunicorn.conf.py', '--workers', '1',
+                         '--bind', '127.0.0.1:{port}', 'app:app'],
+    'uvicorn asgi': ['uvicorn', 'asgi:app', '--workers', '1', '--host', '127.0.0.1',
+                     '--port', '{port}', '--log-level', 'warning'],
+}
+
+PDF_BODY = json.dumps({'applicable_visas': [{
+    'name': 'Eビザ', 'description': 'ベンチマーク', 'confidence': 1.0,
+    'satisfied_conditions': [{'question': '申請者と会社の国籍が同じです'}] * 20,
+    'missing_conditions': []
+}]}, ensure_ascii=False).encode('utf-8')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+async def request(port, method, path, body=b'', timeout=10.0):
+    reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+    try:
+        head = (f'{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n'
+                f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n')
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+        return response.startswith(b'HTTP/1.1 200') or response.startswith(b'HTTP/1.0 200')
+    finally:
+        writer.close()
+
+
+async def fast_client(port, stop_at, latencies, errors, offset):
+    count = offset
+    while time.time() < stop_at:
+        count += 1
+        started = time.perf_counter()
+        try:
+            if count % 10 == 0:
+                ok = await request(port, 'POST', '/api/export/pdf', PDF_BODY)
+            else:
+                ok = await request(port, 'GET', '/api/visa/question?type=E')
+        except (OSError, asyncio.TimeoutError):
+            ok = False
+        if ok:
+            latencies.append(time.perf_counter() - started)
+        else:
+            errors.append(1)
+
+
+async def slow_client(port, stop_at):
+    """Send a request body one byte at a time until the run ends"""
+    body = json.dumps({'answers': {'visa_q1': True}}).encode('utf-8')
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write((f'POST /api/evaluate HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+                      f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n').encode())
+        interval = max((stop_at - time.time()) / len(body), 0.01)
+        for byte in body:
+            if time.time() >= stop_at:
+                break
+            writer.write(bytes([byte]))
+            await writer.drain()
+            await asyncio.sleep(interval)
+        writer.close()
+    except OSError:
+        pass
+
+
+async def run_load(port, concurrency, slow_clients, duration):
+    stop_at = time.time() + duration
+    latencies = []
+    errors = []
+    tasks = [slow_client(port, stop_at) for _ in range(slow_clients)]
+    # Let the slow clients connect first, as they would under real traffic
+    slow = [asyncio.ensure_future(t) for t in tasks]
+    await asyncio.sleep(0.5)
+    await asyncio.gather(*[fast_client(port, stop_at, latencies, errors, i) for i in range(concurrency)])
+    for task in slow:
+        task.cancel()
+    return latencies, errors
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ASGI vs gunicorn concurrency benchmark')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--slow-clients', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--servers', default=','.join(SERVERS))
+    args = parser.parse_args(argv)
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    print(f"Concurrency: {args.concurrency}, slow clients: {args.slow_clients}, duration: {args.duration}s")
+    print(f"{'Server':<18}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+
+    for name in args.servers.split(','):
+        port = free_port()
+        command = [part.format(port=port) for part in SERVERS[name]]
+        server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_for_port(port):
+                print(f"{name:<18}failed to start")
+                continue
+            latencies, errors = asyncio.run(
+                run_load(port, args.concurrency, args.slow_clients, args.duration))
+            print(f"{name:<18}{len(latencies) / args.duration:>8.1f}"
+                  f"{percentile(latencies, 0.50) * 1000:>9.1f}"
+                  f"{percentile(latencies, 0.95) * 1000:>9.1f}"
+                  f"{percentile(latencies, 0.99) * 1000:>9.1f}"
+                  f"{len(errors):>8}")
+        finally:
+            server.terminate()
+            server.wait()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
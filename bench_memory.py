@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Per-worker memory benchmark for the rule and decision tree model
+
+Loads the model in a parent process (as gunicorn --preload does), forks
+workers that each read the whole model, and reports how much memory every
+worker had to copy (Private_Dirty growth from /proc/self/smaps_rollup).
+
+Compares the raw json.load dicts the engines used to keep with the compact
+visa_model records, each with and without gc.freeze() before forking.
+
+Usage:
+    python bench_memory.py [--workers 4] [--copies 50]
+
+--copies loads the model several times to approximate larger trees.
+Linux only.
+"""
+
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+from types import MappingProxyType
+
+RULE_FILES = ['rules.json', 'e_visa_rules.json', 'l_visa_rules.json', 'b_visa_rules.json']
+
+
+def private_dirty_kb():
+    with open('/proc/self/smaps_rollup', 'r') as f:
+        for line in f:
+            if line.startswith('Private_Dirty:'):
+                return int(line.split()[1])
+    return 0
+
+
+def load_model(kind, copies):
+    if kind == 'raw':
+        models = []
+        for _ in range(copies):
+            for rules_file in RULE_FILES:
+                with open(rules_file, 'r', encoding='utf-8') as f:
+                    models.append(json.load(f))
+        return models
+
+    from visa_model import load_rule_base, load_decision_tree
+    models = []
+    for _ in range(copies):
+        models.append(load_rule_base(RULE_FILES[0]))
+        for rules_file in RULE_FILES[1:]:
+            models.append(load_decision_tree(rules_file))
+    return models
+
+
+def touch(value):
+    """Read every object in the model, like serving requests against it would"""
+    if isinstance(value, (dict, MappingProxyType)):
+        for k, v in value.items():
+            touch(k)
+            touch(v)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            touch(v)
+    elif hasattr(value, '__slots__') and not isinstance(value, (str, type)):
+        for name in value.__slots__:
+            touch(getattr(value, name))
+
+
+def run_scenario(kind, freeze, workers, copies):
+    """Load in this process, fork workers and collect their copied memory"""
+    model = load_model(kind, copies)
+    gc.collect()
+    if freeze:
+        gc.freeze()
+
+    readers = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            before = private_dirty_kb()
+            touch(model)
+            gc.collect()
+            after = private_dirty_kb()
+            os.write(write_fd, str(after - before).encode())
+            os._exit(0)
+        os.close(write_fd)
+        readers.append((pid, read_fd))
+
+    copied = []
+    for pid, read_fd in readers:
+        copied.append(int(os.read(read_fd, 64).decode()))
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+
+    return {
+        'model': kind,
+        'gc_freeze': freeze,
+        'copied_kb_per_worker': sum(copied) / len(copied)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Per-worker memory benchmark')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--copies', type=int, default=50)
+    parser.add_argument('--scenario', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    if args.scenario:
+        kind, freeze = args.scenario.split(':')
+        print(json.dumps(run_scenario(kind, freeze == 'freeze', args.workers, args.copies)))
+        return 0
+
+    print(f"Workers: {args.workers}, model copies: {args.copies}")
+    print(f"{'Model':<10}{'gc.freeze':<12}{'Copied per worker':>20}")
+
+    # Each scenario runs in a fresh interpreter so they don't share heap state
+    for scenario in ['raw:nofreeze', 'raw:freeze', 'compact:nofreeze', 'compact:freeze']:
+        output = subprocess.run(
+            [sys.executable, __file__, '--scenario', scenario,
+             '--workers', str(args.workers), '--copies', str(args.copies)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{result['model']:<10}{str(result['gc_freeze']):<12}"
+              f"{result['copied_kb_per_worker']:>17.0f} KB")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,65 @@
-import json
+from collections import deque
+
+from visa_model import load_decision_tree
 
 class EVisaDecisionEngine:
     def __init__(self, rules_file='e_visa_rules.json'):
-        with open(rules_file, 'r', encoding='utf-8') as f:
-            self.data = json.load(f)
-        self.decision_tree = self.data['decision_tree']
-        self.visa_type = self.data['visa_type']
+        self.visa_type, self.decision_tree = load_decision_tree(rules_file)
+        self._build_knowledge_index()
+
+    def _build_knowledge_index(self):
+        """Precompute children, child counts and a question search index"""
+        nodes = self.decision_tree.nodes
+        index = self.decision_tree.index
+
+        # Distinct children of every node, as positions in the node array
+        children = []
+        for node in nodes:
+            if node.type == 'multiple_choice':
+                targets = [option.next for option in node.options or ()]
+            else:
+                targets = [node.yes, node.no]
+            positions = []
+            for target in targets:
+                position = index.get(target)
+                if position is not None and position not in positions:
+                    positions.append(position)
+            children.append(tuple(positions))
+        self._children = tuple(children)
+
+        # Reachable sets as bitmasks, so shared subtrees are counted once.
+        # Iterative post-order DFS: a node is resolved after all its children,
+        # and only a child on the current path (a cycle) is skipped.
+        reachable = [None] * len(nodes)
+        on_path = set()
+        for start in range(len(nodes)):
+            if reachable[start] is not None:
+                continue
+            stack = [(start, iter(self._children[start]))]
+            on_path.add(start)
+            while stack:
+                position, children = stack[-1]
+                child = next(children, None)
+                if child is not None:
+                    if reachable[child] is None and child not in on_path:
+                        on_path.add(child)
+                        stack.append((child, iter(self._children[child])))
+                    continue
+                mask = 0
+                for child in self._children[position]:
+                    mask |= (1 << child) | (reachable[child] or 0)
+                reachable[position] = mask
+                on_path.discard(position)
+                stack.pop()
+        self._descendant_counts = tuple(bin(mask & ~(1 << i)).count('1') for i, mask in enumerate(reachable))
+
+        # Character bigram index over question text (Japanese has no word breaks)
+        postings = {}
+        for position, node in enumerate(nodes):
+            text = (node.question or node.title or '').lower()
+            for gram in {text[i:i + 2] for i in range(max(len(text) - 1, 0))}:
+                postings.setdefault(gram, []).append(position)
+        self._search_index = {gram: tuple(positions) for gram, positions in postings.items()}
 
     def get_current_question(self, current_node_id, answers=None):
         """Get the current question based on node ID and previous answers"""
@@ -25,8 +79,8 @@ class EVisaDecisionEngine:
                 'decision': node['decision'],
                 'title': node['title'],
                 'message': node['message'],
-                'next_steps': node.get('next_steps', []),
-                'alternatives': node.get('alternatives', [])
+                'next_steps': list(node.get('next_steps', ())),
+                'alternatives': list(node.get('alternatives', ()))
             }
 
         # Otherwise, return the question
@@ -35,7 +89,7 @@ class EVisaDecisionEngine:
             'node_id': current_node_id,
             'question': node['question'],
             'question_type': node['type'],
-            'options': node.get('options', None)
+            'options': [option.as_dict() for option in node.options] if node.options else None
         }
 
     def get_next_node(self, current_node_id, answer):
@@ -98,3 +152,88 @@ class EVisaDecisionEngine:
             'path': path,
             'questions_asked': len([p for p in path if self.decision_tree['nodes'].get(p, {}).get('type') != 'result'])
         }
+
+    def _node_summary(self, position, depth):
+        node = self.decision_tree.nodes[position]
+        return {
+            'node_id': node.id,
+            'depth': depth,
+            'node': node.as_dict(),
+            'children': [self.decision_tree.nodes[c].id for c in self._children[position]],
+            'child_count': len(self._children[position]),
+            'descendant_count': self._descendant_counts[position]
+        }
+
+    def get_subtree(self, root_id=None, max_depth=2, cursor=0, limit=100):
+        """Get one page of the nodes below root_id, breadth first
+
+        Nodes deeper than max_depth are not returned; their parents' child
+        counts tell the client they can be expanded. Returns None for an
+        unknown root.
+        """
+        index = self.decision_tree.index
+        root_id = root_id or self.decision_tree.root
+        if root_id not in index:
+            return None
+
+        page = []
+        seen = {index[root_id]}
+        queue = deque([(index[root_id], 0)])
+        offset = 0
+        has_more = False
+
+        # Walk only as far as this page needs
+        while queue:
+            position, depth = queue.popleft()
+            if offset >= cursor:
+                if len(page) == limit:
+                    has_more = True
+                    break
+                page.append(self._node_summary(position, depth))
+            offset += 1
+            if depth < max_depth:
+                for child in self._children[position]:
+                    if child not in seen:
+                        seen.add(child)
+                        queue.append((child, depth + 1))
+
+        return {
+            'root': root_id,
+            'max_depth': max_depth,
+            'nodes': page,
+            'next_cursor': cursor + len(page) if has_more else None
+        }
+
+    def search_questions(self, query, limit=20):
+        """Find nodes whose question (or result title) contains query"""
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        nodes = self.decision_tree.nodes
+        if len(query) < 2:
+            candidates = range(len(nodes))
+        else:
+            # Intersect bigram postings, then confirm the full substring
+            candidates = None
+            for gram in {query[i:i + 2] for i in range(len(query) - 1)}:
+                positions = set(self._search_index.get(gram, ()))
+                candidates = positions if candidates is None else candidates & positions
+                if not candidates:
+                    return []
+            candidates = sorted(candidates)
+
+        matches = []
+        for position in candidates:
+            node = nodes[position]
+            if query in (node.question or node.title or '').lower():
+                matches.append({
+                    'node_id': node.id,
+                    'type': node.type,
+                    'text': node.question or node.title,
+                    'child_count': len(self._children[position]),
+                    'descendant_count': self._descendant_counts[position]
+                })
+                if len(matches) == limit:
+                    break
+        return matches
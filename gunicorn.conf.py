@@ -0,0 +1,21 @@
+"""
+Gunicorn settings
+The rule base and decision trees are loaded once in the master (preload_app)
+and frozen out of the garbage collector before workers fork, so the pages
+holding them stay shared between workers.
+"""
+
+import gc
+
+preload_app = True
+worker_class = 'gthread'
+# An open /ws/visa socket holds one of these threads; app.py caps sockets at
+# WS_MAX_CONNECTIONS (default 8) per worker so the rest always serve HTTP.
+# Raise both together.
+threads = 16
+
+
+def pre_fork(server, worker):
+    # A collection in a worker would write GC headers on every tracked object
+    # and un-share its page; frozen objects are never scanned
+    gc.freeze()
@@ -5,9 +5,18 @@ Handles E-visa, L-visa, and B-visa decision trees
 
 import json
 
+# _advance marker for a walk that stopped without reaching a result (an
+# answer with no next node, a missing node or a loop)
+DEAD_END = 'dead_end'
+
 class MultiVisaEngine:
-    def __init__(self):
-        """Initialize engines for all visa types"""
+    def __init__(self, equivalences=None):
+        """Initialize engines for all visa types
+
+        equivalences optionally lists extra groups of (visa_type, node_id)
+        pairs that ask the same thing; nodes with identical question text are
+        always treated as the same fact.
+        """
         self.engines = {}
 
         # Load E-visa rules
@@ -34,6 +43,38 @@ class MultiVisaEngine:
         except Exception as e:
             print(f"Error loading B-visa engine: {e}")
 
+        self._build_shared_facts(equivalences or [])
+
+    def _build_shared_facts(self, equivalences):
+        """Map every question node to a shared fact id ("<type>.<node_id>" of its first occurrence)"""
+        self.fact_by_node = {}
+        self.fact_nodes = {}
+        fact_by_text = {}
+
+        for visa_type, engine in self.engines.items():
+            for node_id, node in engine.decision_tree['nodes'].items():
+                if node.get('type') == 'result':
+                    continue
+                # Only questions with the same answers can be merged
+                options = tuple(o['value'] for o in node.get('options', []))
+                key = (node['question'].strip(), node['type'], options)
+                fact_id = fact_by_text.setdefault(key, f'{visa_type}.{node_id}')
+                self.fact_by_node[(visa_type, node_id)] = fact_id
+
+        # Explicit equivalences merge whole groups into the first member's fact
+        for group in equivalences:
+            members = [tuple(member) for member in group if tuple(member) in self.fact_by_node]
+            if len(members) < 2:
+                continue
+            target = self.fact_by_node[members[0]]
+            merged = {self.fact_by_node[member] for member in members[1:]}
+            for node_key, fact_id in self.fact_by_node.items():
+                if fact_id in merged:
+                    self.fact_by_node[node_key] = target
+
+        for node_key, fact_id in self.fact_by_node.items():
+            self.fact_nodes.setdefault(fact_id, []).append(node_key)
+
     def get_engine(self, visa_type):
         """Get the engine for a specific visa type"""
         if visa_type not in self.engines:
@@ -49,3 +90,77 @@ class MultiVisaEngine:
         """Get next node for a specific visa type"""
         engine = self.get_engine(visa_type)
         return engine.get_next_node(current_node_id, answer)
+
+    def _advance(self, visa_type, fact_answers):
+        """Walk one tree as far as the shared answers allow
+
+        Returns (node_id, path, pending_fact); pending_fact is None once a
+        result is reached and DEAD_END when the walk stops without one.
+        """
+        engine = self.get_engine(visa_type)
+        nodes = engine.decision_tree['nodes']
+        node_id = engine.decision_tree['root']
+        path = [node_id]
+
+        while node_id in nodes:
+            if nodes[node_id].get('type') == 'result':
+                return node_id, path, None
+            fact_id = self.fact_by_node[(visa_type, node_id)]
+            if fact_id not in fact_answers:
+                return node_id, path, fact_id
+            next_node = engine.get_next_node(node_id, fact_answers[fact_id])
+            if not next_node or next_node in path:
+                break
+            node_id = next_node
+            path.append(node_id)
+
+        return node_id, path, DEAD_END
+
+    def evaluate_combined(self, fact_answers, visa_types=None):
+        """Walk all trees at once over shared facts
+
+        Returns every question still needed (each shared fact once, across all
+        trees) together with the outcome of each tree that has finished.
+        Trees whose answers lead nowhere are listed in dead_ends with a
+        dead_end outcome; complete is only set once every tree has a result.
+        """
+        visa_types = visa_types or list(self.engines.keys())
+        questions = {}
+        outcomes = {}
+        paths = {}
+        dead_ends = []
+
+        for visa_type in visa_types:
+            node_id, path, fact_id = self._advance(visa_type, fact_answers)
+            paths[visa_type] = path
+            engine = self.get_engine(visa_type)
+
+            if fact_id is None:
+                outcomes[visa_type] = engine.get_current_question(node_id)
+                continue
+
+            if fact_id == DEAD_END:
+                outcomes[visa_type] = {'type': DEAD_END, 'node_id': node_id}
+                dead_ends.append(visa_type)
+                continue
+
+            outcomes[visa_type] = None
+            if fact_id not in questions:
+                question_data = engine.get_current_question(node_id)
+                questions[fact_id] = {
+                    'fact_id': fact_id,
+                    'question': question_data['question'],
+                    'question_type': question_data['question_type'],
+                    'options': question_data['options'],
+                    'nodes': {}
+                }
+            questions[fact_id]['nodes'][visa_type] = node_id
+
+        return {
+            'complete': not questions and not dead_ends,
+            'questions': list(questions.values()),
+            'outcomes': outcomes,
+            'dead_ends': dead_ends,
+            'paths': paths,
+            'answered': len(fact_answers)
+        }
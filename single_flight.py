@@ -0,0 +1,81 @@
+"""
+Request Coalescing
+Single-flight wrapper for expensive engine and PDF calls: concurrent callers
+with the same canonical request key share one computation.
+
+The first caller for a key computes; callers arriving while it runs wait for
+its result instead of computing again. Coalescing is per process (one
+gunicorn worker and its threads); nothing is cached once the call finishes.
+"""
+
+import hashlib
+import json
+import threading
+
+
+def request_key(namespace, payload):
+    """Canonical hash of a JSON-serializable request payload"""
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False,
+                           separators=(',', ':'), default=str)
+    return f"{namespace}:{hashlib.sha256(canonical.encode('utf-8')).hexdigest()}"
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, timeout=30.0):
+        """timeout is how long a duplicate waits before computing on its own"""
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {'leaders': 0, 'coalesced': 0, 'timeouts': 0, 'errors': 0}
+
+    def do(self, key, fn, timeout=None):
+        """Run fn() once for all concurrent callers with the same key"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._stats['leaders'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+                with self._lock:
+                    self._stats['errors'] += 1
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+            return call.result
+
+        if not call.done.wait(self.timeout if timeout is None else timeout):
+            # The leader is taking too long; don't hold this caller hostage
+            with self._lock:
+                self._stats['timeouts'] += 1
+            return fn()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self):
+        """Counters since start, plus the number of calls in flight"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        return stats
@@ -75,10 +75,13 @@ async function startQuestionnaire() {
 async function loadQuestions() {
     try {
         const answeredQuestions = Object.keys(currentState.answers).join(',');
+        const yesQuestions = Object.keys(currentState.answers)
+            .filter(id => currentState.answers[id] === true)
+            .join(',');
         const visaTypesParam = currentState.selectedVisaTypes.length > 0
             ? `&visa_types=${currentState.selectedVisaTypes.join(',')}`
             : '';
-        const url = `/api/questions?answered=${answeredQuestions}${visaTypesParam}`;
+        const url = `/api/questions?answered=${answeredQuestions}&yes=${yesQuestions}&strategy=information_gain${visaTypesParam}`;
         console.log('Loading questions from:', url);
 
         const response = await fetch(url);
@@ -106,6 +106,139 @@ async function updateDevPanel() {
     document.getElementById('devAnswers').textContent = JSON.stringify(formattedAnswers, null, 2);
 }
 
+// Optional WebSocket transport: one connection carries the whole session.
+// Falls back to the HTTP endpoints when the server or browser lacks support,
+// the server is at its socket limit (503 on the handshake), the handshake
+// doesn't finish in time, or the socket closes before a reply arrives.
+const SOCKET_OPEN_TIMEOUT = 2000;
+let visaSocket = null;
+let socketWaiters = [];
+let sessionOverSocket = false;  // Current session was started over the socket
+
+function openVisaSocket() {
+    return new Promise(resolve => {
+        if (visaSocket && visaSocket.readyState === WebSocket.OPEN) {
+            resolve(visaSocket);
+            return;
+        }
+        if (!('WebSocket' in window)) {
+            resolve(null);
+            return;
+        }
+
+        let socket;
+        try {
+            const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+            socket = new WebSocket(`${protocol}://${window.location.host}/ws/visa`);
+        } catch (error) {
+            resolve(null);
+            return;
+        }
+
+        // Don't let a stalled handshake hold up the questionnaire
+        const openTimer = setTimeout(() => {
+            socket.close();
+            resolve(null);
+        }, SOCKET_OPEN_TIMEOUT);
+
+        socket.onopen = () => {
+            clearTimeout(openTimer);
+            visaSocket = socket;
+            resolve(socket);
+        };
+        socket.onerror = () => {
+            clearTimeout(openTimer);
+            resolve(null);
+        };
+        socket.onclose = () => {
+            clearTimeout(openTimer);
+            if (visaSocket === socket) {
+                visaSocket = null;
+            }
+            // Fail anything still waiting for a reply
+            socketWaiters.forEach(waiter => waiter.reject(new Error('WebSocket closed')));
+            socketWaiters = [];
+            resolve(null);
+        };
+        socket.onmessage = event => {
+            const waiter = socketWaiters.shift();
+            if (waiter) {
+                waiter.resolve(JSON.parse(event.data));
+            }
+        };
+    });
+}
+
+// Give the server thread back once the session no longer needs the socket
+function closeVisaSocket() {
+    if (visaSocket) {
+        visaSocket.close();
+        visaSocket = null;
+    }
+}
+
+function sendVisaFrame(frame) {
+    return new Promise((resolve, reject) => {
+        socketWaiters.push({ resolve, reject });
+        visaSocket.send(JSON.stringify(frame));
+    });
+}
+
+// Fetch the first question, shaped like the /api/visa/question response
+async function requestQuestion() {
+    if (visaSocket) {
+        try {
+            const frame = await sendVisaFrame({ op: 'start', type: currentState.visaType });
+            if (frame.error) {
+                return { success: false, error: frame.error };
+            }
+            sessionOverSocket = true;
+            return { success: true, current_node: frame.node, data: frame.data, progress: { path: frame.path } };
+        } catch (error) {
+            // The socket closed before replying; start over HTTP instead
+            console.warn('WebSocket unavailable, using HTTP:', error);
+        }
+    }
+
+    sessionOverSocket = false;
+    const response = await fetch(`/api/visa/question?type=${currentState.visaType}`);
+    return await response.json();
+}
+
+// Submit an answer, shaped like the /api/visa/answer response
+async function requestAnswer(answer) {
+    if (visaSocket) {
+        try {
+            const frame = await sendVisaFrame({ op: 'answer', node_id: currentState.currentNode, answer: answer });
+            if (frame.error) {
+                return { success: false, error: frame.error };
+            }
+            return { success: true, next_node: frame.node, data: frame.data, progress: { path: frame.path } };
+        } catch (error) {
+            // The socket closed (e.g. idle timeout) before replying; retry over HTTP
+            console.warn('WebSocket unavailable, using HTTP:', error);
+        }
+    }
+
+    const response = await fetch(`/api/visa/answer?type=${currentState.visaType}`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            node_id: currentState.currentNode,
+            answer: answer
+        })
+    });
+    const data = await response.json();
+    // The socket dropped mid-session: the HTTP session only knows the answers
+    // since then, so keep the path this page has tracked so far
+    if (sessionOverSocket && data.success) {
+        data.progress.path = [...currentState.path, data.next_node];
+    }
+    return data;
+}
+
 // Select visa type
 function selectVisaType(visaType) {
     currentState.visaType = visaType;
@@ -122,8 +255,11 @@ async function startQuestionnaire() {
     showLoading('診断を開始しています...');
 
     try {
-        // Reset session with visa type
-        await fetch(`/api/visa/reset?type=${currentState.visaType}`, { method: 'POST' });
+        // Always reset the HTTP session too, it is the fallback if the socket drops
+        await Promise.all([
+            openVisaSocket(),
+            fetch(`/api/visa/reset?type=${currentState.visaType}`, { method: 'POST' })
+        ]);
 
         // Reset state (keep visa type and dev mode)
         const visaType = currentState.visaType;
@@ -157,8 +293,7 @@ async function startQuestionnaire() {
 // Load current question
 async function loadQuestion() {
     try {
-        const response = await fetch(`/api/visa/question?type=${currentState.visaType}`);
-        const data = await response.json();
+        const data = await requestQuestion();
 
         if (!data.success) {
             throw new Error(data.error || '質問の読み込みに失敗しました');
@@ -251,18 +386,7 @@ async function submitAnswer(answer) {
     currentState.isLoading = true;
 
     try {
-        const response = await fetch(`/api/visa/answer?type=${currentState.visaType}`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-                node_id: currentState.currentNode,
-                answer: answer
-            })
-        });
-
-        const data = await response.json();
+        const data = await requestAnswer(answer);
 
         if (!data.success) {
             throw new Error(data.error || '回答の送信に失敗しました');
@@ -301,6 +425,7 @@ async function submitAnswer(answer) {
 // Show result
 function showResult(resultData) {
     console.log('Showing result:', resultData);
+    closeVisaSocket();
 
     hideAllSections();
     resultsSection.style.display = 'block';
@@ -374,6 +499,8 @@ function updateProgress() {
 
 // Restart assessment
 async function restartAssessment() {
+    closeVisaSocket();
+
     // Reset session
     if (currentState.visaType) {
         await fetch(`/api/visa/reset?type=${currentState.visaType}`, { method: 'POST' });
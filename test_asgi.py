@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Test script for the ASGI serving mode
+"""
+
+import asyncio
+import json
+import sys
+import os
+import tempfile
+
+# Add the current directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app as flask_module
+from asgi import create_app
+from tree_analytics import FunnelAggregator
+
+def call(asgi_app, method, path, query=b'', body=b'', headers=()):
+    """Drive one HTTP request through the ASGI app and collect the response"""
+    scope = {
+        'type': 'http', 'method': method, 'path': path, 'query_string': query,
+        'headers': [(b'content-type', b'application/json')] + list(headers),
+        'http_version': '1.1', 'scheme': 'http', 'server': ('testserver', 80), 'client': ('127.0.0.1', 1234)
+    }
+    # Deliver the body in two chunks, like a slow client would
+    messages = [{'type': 'http.request', 'body': body[:5], 'more_body': True},
+                {'type': 'http.request', 'body': body[5:], 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi_app(scope, receive, send))
+    headers = dict(sent[0]['headers'])
+    return sent[0]['status'], headers, b''.join(m.get('body', b'') for m in sent[1:])
+
+def test_session_round_trip():
+    """Answers must be kept in the session cookie across ASGI requests"""
+    asgi_app = create_app(threads=2, pdf_threads=1)
+
+    # Keep the funnel events these requests record out of the repo
+    original_analytics = flask_module.funnel_analytics
+    flask_module.funnel_analytics = FunnelAggregator(
+        os.path.join(tempfile.mkdtemp(), 'funnel_analytics.jsonl'))
+    try:
+        status, headers, body = call(asgi_app, 'GET', '/api/visa/question', b'type=L')
+        assert status == 200
+        node = json.loads(body)['current_node']
+
+        answer = json.dumps({'node_id': node, 'answer': True}).encode('utf-8')
+        status, headers, body = call(asgi_app, 'POST', '/api/visa/answer', b'type=L', answer)
+        assert status == 200
+        assert json.loads(body)['progress']['path'] == [node, 'company_blanket_revenue_check']
+
+        cookie = headers[b'set-cookie'].split(b';')[0]
+        status, headers, body = call(asgi_app, 'GET', '/api/visa/question', b'type=L', headers=[(b'cookie', cookie)])
+        assert json.loads(body)['current_node'] == 'company_blanket_revenue_check'
+    finally:
+        flask_module.funnel_analytics = original_analytics
+    print("✓ Session survives across ASGI requests")
+
+if __name__ == "__main__":
+    test_session_round_trip()
+    print("✅ All tests passed!")
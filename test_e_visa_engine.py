@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test script for the decision tree knowledge queries
+"""
+
+import sys
+import os
+
+# Add the current directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from e_visa_engine import EVisaDecisionEngine
+
+def test_subtree_pages_cover_the_tree():
+    """Paging through a subtree must return every node exactly once"""
+    engine = EVisaDecisionEngine('e_visa_rules.json')
+
+    full = engine.get_subtree(max_depth=50, limit=500)
+    assert full['next_cursor'] is None
+    assert len(full['nodes']) == len(engine.decision_tree.nodes)
+
+    paged = []
+    cursor = 0
+    while cursor is not None:
+        page = engine.get_subtree(max_depth=50, cursor=cursor, limit=4)
+        paged.extend(page['nodes'])
+        cursor = page['next_cursor']
+    assert paged == full['nodes']
+
+    root = full['nodes'][0]
+    assert root['node_id'] == 'nationality_same'
+    assert root['child_count'] == 2 and root['descendant_count'] == len(full['nodes']) - 1
+    assert engine.get_subtree('missing_node') is None
+    print(f"✓ {len(paged)} nodes paged")
+
+def count_descendants(engine, node_id):
+    """Brute-force count of the distinct nodes reachable below node_id"""
+    nodes = engine.decision_tree['nodes']
+    seen = set()
+    stack = [node_id]
+    while stack:
+        node = nodes[stack.pop()]
+        if node.get('type') == 'multiple_choice':
+            targets = [option['next'] for option in node['options']]
+        else:
+            targets = [node.get('yes'), node.get('no')]
+        for target in targets:
+            if target in nodes and target not in seen and target != node_id:
+                seen.add(target)
+                stack.append(target)
+    return len(seen)
+
+def test_descendant_counts():
+    """Every node's descendant_count must match a plain reachability count"""
+    for rules_file in ['e_visa_rules.json', 'l_visa_rules.json', 'b_visa_rules.json']:
+        engine = EVisaDecisionEngine(rules_file)
+        for summary in engine.get_subtree(max_depth=50, limit=500)['nodes']:
+            expected = count_descendants(engine, summary['node_id'])
+            assert summary['descendant_count'] == expected, (rules_file, summary['node_id'])
+    print("✓ Descendant counts match a brute-force walk")
+
+def test_search_questions():
+    """Search must find every node containing the query"""
+    engine = EVisaDecisionEngine('e_visa_rules.json')
+    results = engine.search_questions('30万ドル')
+    assert [r['node_id'] for r in results] == [
+        'company_investment_check_1', 'company_investment_check_2',
+        'company_investment_check_3', 'company_investment_check_4'
+    ]
+    assert engine.search_questions('存在しない質問') == []
+
+if __name__ == "__main__":
+    test_subtree_pages_cover_the_tree()
+    test_descendant_counts()
+    test_search_questions()
+    print("✅ All tests passed!")
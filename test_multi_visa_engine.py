@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Test script for the combined E/L/B evaluation
+"""
+
+import json
+import random
+import sys
+import os
+import tempfile
+
+# Add the current directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from e_visa_engine import EVisaDecisionEngine
+from multi_visa_engine import DEAD_END, MultiVisaEngine
+
+def test_combined_matches_separate_sessions():
+    """Combined evaluation must reach the same result as each tree on its own"""
+    engine = MultiVisaEngine()
+    rng = random.Random(0)
+
+    for _ in range(50):
+        truth = {fact_id: rng.random() < 0.5 for fact_id in engine.fact_nodes}
+
+        # Answer every pending question each round
+        answers = {}
+        rounds = 0
+        combined = engine.evaluate_combined(answers)
+        while not combined['complete']:
+            for question in combined['questions']:
+                answers[question['fact_id']] = truth[question['fact_id']]
+            combined = engine.evaluate_combined(answers)
+            rounds += 1
+
+        for visa_type, tree_engine in engine.engines.items():
+            node_answers = {node_id: truth[engine.fact_by_node[(vt, node_id)]]
+                            for (vt, node_id) in engine.fact_by_node if vt == visa_type}
+            separate = tree_engine.evaluate_path(node_answers)
+            assert combined['outcomes'][visa_type]['node_id'] == separate['path'][-1]
+            assert rounds >= separate['questions_asked']
+
+    print("✓ Combined outcomes match separate sessions")
+
+def test_identical_questions_share_a_fact():
+    """Nodes asking the same question are answered once"""
+    engine = MultiVisaEngine()
+    assert (engine.fact_by_node[('L', 'applicant_blanket_stay_check')] ==
+            engine.fact_by_node[('L', 'applicant_individual_stay_check')])
+
+    merged = MultiVisaEngine(equivalences=[[('E', 'nationality_same'), ('L', 'intra_company_transfer')]])
+    assert merged.fact_by_node[('L', 'intra_company_transfer')] == 'E.nationality_same'
+
+def test_dead_end_is_not_a_result():
+    """A tree whose answer leads nowhere must not count as finished"""
+    with open('e_visa_rules.json', 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    root = data['decision_tree']['root']
+    data['decision_tree']['nodes'][root]['no'] = 'missing_node'
+
+    engine = MultiVisaEngine()
+    with tempfile.TemporaryDirectory() as tmp:
+        rules_file = os.path.join(tmp, 'e_visa_rules.json')
+        with open(rules_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        engine.engines['E'] = EVisaDecisionEngine(rules_file)
+    engine._build_shared_facts([])
+
+    combined = engine.evaluate_combined({engine.fact_by_node[('E', root)]: False}, ['E'])
+    assert not combined['complete'] and not combined['questions']
+    assert combined['dead_ends'] == ['E']
+    assert combined['outcomes']['E'] == {'type': DEAD_END, 'node_id': 'missing_node'}
+    print("✓ Dead ends are reported, not treated as results")
+
+if __name__ == "__main__":
+    test_combined_matches_separate_sessions()
+    test_identical_questions_share_a_fact()
+    test_dead_end_is_not_a_result()
+    print("✅ All tests passed!")
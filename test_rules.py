@@ -168,6 +168,36 @@ def test_rule_engine():
     print("All tests completed!")
     return True
 
+def test_information_gain_ordering():
+    """Adaptive ordering must reach the same visas with fewer questions"""
+    engine = VisaRuleEngine('rules.json')
+    boolean_ids = [q['id'] for q in engine.questions if q['type'] == 'boolean']
+
+    # Answer "Yes" to every other question, in both orderings
+    truth = {question_id: i % 2 == 0 for i, question_id in enumerate(boolean_ids)}
+
+    def run(strategy):
+        answers = {}
+        while True:
+            remaining = [q for q in engine.get_next_questions(list(answers), strategy=strategy, answers=answers)
+                         if not q.get('is_screening', False)]
+            if not remaining:
+                return answers
+            answers[remaining[0]['id']] = truth[remaining[0]['id']]
+
+    static_answers = run('static')
+    adaptive_answers = run('information_gain')
+
+    static_visas = sorted(v['type'] for v in engine.get_applicable_visas(static_answers)[0])
+    adaptive_visas = sorted(v['type'] for v in engine.get_applicable_visas(adaptive_answers)[0])
+    assert static_visas == adaptive_visas
+    assert len(adaptive_answers) < len(static_answers)
+    print(f"✓ Information gain: {len(adaptive_answers)} questions instead of {len(static_answers)}")
+
+    # Learned priors stay strictly between 0 and 1
+    learned = engine.learn_priors([{'visa_q1': True}, {'visa_q1': True}, {'visa_q1': False}])
+    assert 0.5 < learned['visa_q1'] < 1.0
+
 def validate_rules_json():
     """Validate the rules.json file structure"""
     print("Validating rules.json structure...")
@@ -235,6 +265,8 @@ if __name__ == "__main__":
 
     # Test the rule engine
     if test_rule_engine():
+        print()
+        test_information_gain_ordering()
         print("✅ All tests passed!")
         sys.exit(0)
     else:
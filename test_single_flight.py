@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test script for request coalescing
+"""
+
+import threading
+import time
+import sys
+import os
+
+# Add the current directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from single_flight import SingleFlight, request_key
+
+def test_concurrent_duplicates_compute_once():
+    """Only the first caller computes; duplicates get its result"""
+    flight = SingleFlight()
+    calls = []
+    results = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return {'visas': ['E_visa']}
+
+    def caller():
+        results.append(flight.do(request_key('evaluate', {'b': 2, 'a': 1}), compute))
+
+    threads = [threading.Thread(target=caller) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert flight.stats() == {'leaders': 1, 'coalesced': 4, 'timeouts': 0, 'errors': 0, 'in_flight': 0}
+    print("✓ 5 concurrent duplicates computed once")
+
+def test_errors_and_timeouts():
+    """Leader errors reach every caller; slow leaders don't block duplicates forever"""
+    flight = SingleFlight(timeout=0.05)
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        time.sleep(0.3)
+        return 'leader'
+
+    leader = threading.Thread(target=lambda: flight.do('key', slow))
+    leader.start()
+    started.wait()
+    assert flight.do('key', lambda: 'fallback') == 'fallback'
+    leader.join()
+    assert flight.stats()['timeouts'] == 1
+
+    def fail():
+        raise ValueError('boom')
+
+    try:
+        flight.do('other', fail)
+    except ValueError:
+        pass
+    else:
+        assert False, "error was swallowed"
+    assert flight.stats()['errors'] == 1 and flight.stats()['in_flight'] == 0
+
+def test_request_key_is_canonical():
+    """Key order must not change the hash"""
+    assert request_key('pdf', {'a': 1, 'b': [1, 2]}) == request_key('pdf', {'b': [1, 2], 'a': 1})
+    assert request_key('pdf', {'a': 1}) != request_key('evaluate', {'a': 1})
+
+if __name__ == "__main__":
+    test_concurrent_duplicates_compute_once()
+    test_errors_and_timeouts()
+    test_request_key_is_canonical()
+    print("✅ All tests passed!")
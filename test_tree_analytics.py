@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Test script for the decision tree funnel analytics
+"""
+
+import sys
+import os
+import tempfile
+
+# Add the current directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from tree_analytics import FunnelAggregator, build_funnels, load_batches
+
+def test_funnel_export():
+    """Flushed events must add up to per-node funnels"""
+    path = os.path.join(tempfile.mkdtemp(), 'funnel_analytics.jsonl')
+    aggregator = FunnelAggregator(path, flush_interval=3600)
+
+    # Two sessions: one finishes, one drops off at the second question
+    aggregator.record_start('E', 'nationality_same')
+    aggregator.record_transition('E', 'nationality_same', True, 'company_investment_check_1', seconds=2.0)
+    aggregator.record_transition('E', 'company_investment_check_1', 'yes', 'result_e_visa_approved',
+                                 seconds=4.0, is_result=True)
+    aggregator.record_start('E', 'nationality_same')
+    aggregator.record_transition('E', 'nationality_same', 'yes', 'company_investment_check_1', seconds=4.0)
+    aggregator.flush()
+
+    funnel = build_funnels(load_batches(path))['E']
+    root = funnel['nodes']['nationality_same']
+    second = funnel['nodes']['company_investment_check_1']
+
+    assert funnel['sessions'] == 2
+    assert root['entered'] == 2 and root['answers'] == {'yes': 2} and root['mean_seconds'] == 3.0
+    assert second['entered'] == 2 and second['drop_off'] == 1
+    assert funnel['results'] == {'result_e_visa_approved': 1}
+    print("✓ Funnel export matches recorded events")
+
+if __name__ == "__main__":
+    test_funnel_export()
+    print("✅ All tests passed!")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Test script for the decision tree optimizer
+"""
+
+import json
+import sys
+import os
+
+# Add the current directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from tree_optimizer import DecisionTreeOptimizer
+
+def load_tree(rules_file):
+    with open(rules_file, 'r', encoding='utf-8') as f:
+        return json.load(f)['decision_tree']
+
+def test_optimizer_preserves_results():
+    """Reordered trees must reach the same result for every answer vector"""
+    for rules_file in ['e_visa_rules.json', 'l_visa_rules.json', 'b_visa_rules.json']:
+        tree = load_tree(rules_file)
+
+        # Make the last check of every chain the most decisive one
+        optimizer = DecisionTreeOptimizer(tree)
+        frequencies = {}
+        for chain in optimizer.find_chains():
+            stop_answer = 'yes' if chain['kind'] == 'OR' else 'no'
+            other = 'no' if stop_answer == 'yes' else 'yes'
+            for i, node_id in enumerate(chain['members']):
+                frequencies[node_id] = {stop_answer: i + 1, other: 10}
+
+        optimizer = DecisionTreeOptimizer(tree, frequencies)
+        optimized = optimizer.optimize()
+
+        assert optimizer.verify(optimized) == []
+        assert optimizer.expected_depth(optimized) < optimizer.expected_depth()
+        print(f"✓ {rules_file}: {optimizer.expected_depth():.3f} -> {optimizer.expected_depth(optimized):.3f}")
+
+def test_verify_detects_changed_results():
+    """Swapping the branches of a check must be reported"""
+    tree = load_tree('e_visa_rules.json')
+    broken = json.loads(json.dumps(tree))
+    node = broken['nodes']['nationality_same']
+    node['yes'], node['no'] = node['no'], node['yes']
+
+    assert DecisionTreeOptimizer(tree).verify(broken)
+
+def test_no_frequencies_keeps_order():
+    """Without observed answers the hand-written order is kept"""
+    tree = load_tree('l_visa_rules.json')
+    assert DecisionTreeOptimizer(tree).optimize() == tree
+
+if __name__ == "__main__":
+    test_optimizer_preserves_results()
+    test_verify_detects_changed_results()
+    test_no_frequencies_keeps_order()
+    print("✅ All tests passed!")
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Test script for the compact rule and decision tree model
+"""
+
+import json
+import sys
+import os
+import tempfile
+
+# Add the current directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from visa_model import load_decision_tree, load_rule_base
+
+def test_round_trip():
+    """as_dict() must give back the JSON the model was loaded from"""
+    for rules_file in ['e_visa_rules.json', 'l_visa_rules.json', 'b_visa_rules.json']:
+        with open(rules_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        visa_type, decision_tree = load_decision_tree(rules_file)
+        assert visa_type.as_dict() == data['visa_type']
+        assert decision_tree.as_dict() == data['decision_tree']
+
+    with open('rules.json', 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    rule_base = load_rule_base('rules.json')
+    assert [q.as_dict() for q in rule_base.questions] == data['questions']
+    print("✓ Model round-trips to the original JSON")
+
+def test_records_are_immutable():
+    """Shared records must not be modified by request handlers"""
+    _, decision_tree = load_decision_tree('e_visa_rules.json')
+    node = decision_tree['nodes']['nationality_same']
+    assert node['yes'] == 'company_investment_check_1' and node.get('options') is None
+
+    try:
+        node.yes = 'result_e_visa_approved'
+    except AttributeError:
+        pass
+    else:
+        assert False, "TreeNode accepted an assignment"
+
+def test_extra_keys_and_nulls():
+    """Unknown keys are kept and an explicit null is not an absent key"""
+    with open('l_visa_rules.json', 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    root = data['decision_tree']['root']
+    data['decision_tree']['nodes'][root]['help'] = '補足説明'
+    data['decision_tree']['nodes'][root]['title'] = None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rules_file = os.path.join(tmp, 'l_visa_rules.json')
+        with open(rules_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        _, decision_tree = load_decision_tree(rules_file)
+
+    node = decision_tree['nodes'][root]
+    assert node['help'] == '補足説明' and 'help' in node
+    assert node['title'] is None and 'title' in node
+    assert 'options' not in node and node.get('options', 'absent') == 'absent'
+    assert decision_tree.as_dict() == data['decision_tree']
+    print("✓ Extra keys and nulls survive loading")
+
+if __name__ == "__main__":
+    test_round_trip()
+    test_records_are_immutable()
+    test_extra_keys_and_nulls()
+    print("✅ All tests passed!")
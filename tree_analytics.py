@@ -0,0 +1,213 @@
+"""
+Decision Tree Funnel Analytics
+Counts per-node transitions and time spent in the E/L/B decision trees.
+
+Request handlers only append a small tuple to a bounded ring buffer
+(collections.deque appends are atomic, so no lock is taken on the request
+path). A background thread drains the buffer every few seconds, aggregates
+it and appends one JSON line per flush to a local file.
+
+Export per-tree funnels with:
+    python tree_analytics.py funnel_analytics.jsonl --output funnels.json \
+        --frequencies-dir .
+
+The frequency files can be fed to tree_optimizer.py --frequencies.
+"""
+
+import argparse
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+
+def normalize_answer(answer):
+    """Map the answer payloads the clients send onto stable keys"""
+    if answer is True or answer == 'yes':
+        return 'yes'
+    if answer is False or answer == 'no':
+        return 'no'
+    return str(answer)
+
+
+class FunnelAggregator:
+    def __init__(self, path='funnel_analytics.jsonl', flush_interval=10.0, capacity=100000):
+        """Buffer funnel events in memory and flush them to path periodically"""
+        self.path = path
+        self.flush_interval = flush_interval
+        self.events = deque(maxlen=capacity)
+        self._flush_lock = threading.Lock()
+        self._worker_pid = None
+
+    def record_start(self, visa_type, node_id):
+        """Record a session entering the tree at its root"""
+        self._ensure_flusher()
+        self.events.append(('start', visa_type, node_id))
+
+    def record_transition(self, visa_type, node_id, answer, next_node, seconds=None, is_result=False):
+        """Record an answer at a node, the time spent on it and where it led"""
+        self._ensure_flusher()
+        self.events.append(('answer', visa_type, node_id, normalize_answer(answer),
+                            next_node, seconds, is_result))
+
+    def _ensure_flusher(self):
+        # Started lazily so each forked gunicorn worker gets its own thread
+        if self._worker_pid == os.getpid():
+            return
+        with self._flush_lock:
+            if self._worker_pid == os.getpid():
+                return
+            self._worker_pid = os.getpid()
+            thread = threading.Thread(target=self._flush_loop, name='funnel-analytics', daemon=True)
+            thread.start()
+            atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[ANALYTICS] Flush failed: {e}")
+
+    def drain(self):
+        """Remove all buffered events and return them aggregated"""
+        starts = {}
+        transitions = {}
+        dwell = {}
+        results = {}
+
+        while True:
+            try:
+                event = self.events.popleft()
+            except IndexError:
+                break
+
+            if event[0] == 'start':
+                _, visa_type, node_id = event
+                key = (visa_type, node_id)
+                starts[key] = starts.get(key, 0) + 1
+                continue
+
+            _, visa_type, node_id, answer, next_node, seconds, is_result = event
+            key = (visa_type, node_id, answer, next_node)
+            transitions[key] = transitions.get(key, 0) + 1
+            if is_result:
+                results[(visa_type, next_node)] = results.get((visa_type, next_node), 0) + 1
+            if seconds is not None:
+                count, total = dwell.get((visa_type, node_id), (0, 0.0))
+                dwell[(visa_type, node_id)] = (count + 1, total + seconds)
+
+        return {
+            'starts': [[vt, node, count] for (vt, node), count in starts.items()],
+            'transitions': [[vt, node, answer, next_node, count]
+                            for (vt, node, answer, next_node), count in transitions.items()],
+            'dwell': [[vt, node, count, round(total, 3)] for (vt, node), (count, total) in dwell.items()],
+            'results': [[vt, node, count] for (vt, node), count in results.items()]
+        }
+
+    def flush(self):
+        """Append the buffered events to the analytics file as one JSON line"""
+        with self._flush_lock:
+            batch = self.drain()
+            if not (batch['starts'] or batch['transitions']):
+                return
+            batch['pid'] = os.getpid()
+            batch['flushed_at'] = time.time()
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(batch, ensure_ascii=False) + '\n')
+
+
+def build_funnels(batches):
+    """Combine flushed batches into per-tree funnels
+
+    Each node reports how many sessions entered it, how many answered it,
+    how many dropped off there, its answer counts and mean time spent.
+    """
+    funnels = {}
+
+    def node_stats(visa_type, node_id):
+        tree = funnels.setdefault(visa_type, {'sessions': 0, 'nodes': {}, 'results': {}})
+        return tree['nodes'].setdefault(node_id, {
+            'entered': 0, 'answered': 0, 'answers': {}, 'dwell_count': 0, 'dwell_seconds': 0.0
+        })
+
+    for batch in batches:
+        for visa_type, node_id, count in batch.get('starts', []):
+            node_stats(visa_type, node_id)['entered'] += count
+            funnels[visa_type]['sessions'] += count
+        for visa_type, node_id, answer, next_node, count in batch.get('transitions', []):
+            stats = node_stats(visa_type, node_id)
+            stats['answered'] += count
+            stats['answers'][answer] = stats['answers'].get(answer, 0) + count
+            if next_node:
+                node_stats(visa_type, next_node)['entered'] += count
+        for visa_type, node_id, count, total in batch.get('dwell', []):
+            stats = node_stats(visa_type, node_id)
+            stats['dwell_count'] += count
+            stats['dwell_seconds'] += total
+        for visa_type, node_id, count in batch.get('results', []):
+            results = funnels[visa_type]['results']
+            results[node_id] = results.get(node_id, 0) + count
+
+    for tree in funnels.values():
+        for node_id, stats in tree['nodes'].items():
+            if node_id in tree['results']:
+                stats['drop_off'] = 0
+            else:
+                stats['drop_off'] = max(0, stats['entered'] - stats['answered'])
+            stats['mean_seconds'] = (round(stats['dwell_seconds'] / stats['dwell_count'], 2)
+                                     if stats['dwell_count'] else None)
+            del stats['dwell_count'], stats['dwell_seconds']
+        # Hottest nodes and most common results first
+        tree['results'] = dict(sorted(tree['results'].items(), key=lambda item: -item[1]))
+        tree['nodes'] = dict(sorted(tree['nodes'].items(), key=lambda item: -item[1]['entered']))
+
+    return funnels
+
+
+def load_batches(path):
+    """Read the flushed batches from an analytics file"""
+    batches = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                batches.append(json.loads(line))
+    return batches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export per-tree funnels from funnel analytics')
+    parser.add_argument('analytics_file', nargs='?', default='funnel_analytics.jsonl')
+    parser.add_argument('--output', help='Where to write the funnels JSON (default: stdout)')
+    parser.add_argument('--frequencies-dir',
+                        help='Also write <type>_frequencies.json answer counts for tree_optimizer.py')
+    args = parser.parse_args(argv)
+
+    funnels = build_funnels(load_batches(args.analytics_file))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(funnels, f, ensure_ascii=False, indent=2)
+        print(f"Funnels written to {args.output}")
+    else:
+        print(json.dumps(funnels, ensure_ascii=False, indent=2))
+
+    if args.frequencies_dir:
+        for visa_type, tree in funnels.items():
+            frequencies = {node_id: stats['answers'] for node_id, stats in tree['nodes'].items()
+                           if stats['answers']}
+            path = os.path.join(args.frequencies_dir, f'{visa_type.lower()}_frequencies.json')
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(frequencies, f, ensure_ascii=False, indent=2)
+            print(f"Answer frequencies written to {path}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
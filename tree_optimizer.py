@@ -0,0 +1,282 @@
+"""
+Decision Tree Optimizer
+Reorders independent checks in the E/L/B decision trees to minimize the
+expected number of questions, based on observed answer frequencies.
+
+Usage:
+    python tree_optimizer.py e_visa_rules.json --frequencies e_freq.json \
+        --output e_visa_rules.optimized.json
+
+The frequencies file maps node ids to answer counts, e.g.
+    {"company_investment_check_1": {"yes": 40, "no": 60}}
+Nodes without data are treated as a 50/50 split.
+"""
+
+import argparse
+import copy
+import json
+import sys
+
+
+class DecisionTreeOptimizer:
+    def __init__(self, decision_tree, frequencies=None):
+        """Wrap a decision tree ({'root': ..., 'nodes': {...}}) and answer counts"""
+        self.decision_tree = decision_tree
+        self.frequencies = frequencies or {}
+
+    def answer_probabilities(self, node_id):
+        """Get the observed probability of each answer at a node"""
+        node = self.decision_tree['nodes'][node_id]
+        answers = self._answers(node)
+        counts = self.frequencies.get(node_id, {})
+        total = sum(counts.get(a, 0) for a in answers)
+        if total == 0:
+            return {a: 1.0 / len(answers) for a in answers}
+        return {a: counts.get(a, 0) / total for a in answers}
+
+    def expected_depth(self, decision_tree=None):
+        """Expected number of questions from the root to a result node"""
+        tree = decision_tree or self.decision_tree
+        nodes = tree['nodes']
+        memo = {}
+
+        def depth(node_id, visiting):
+            if node_id in memo:
+                return memo[node_id]
+            node = nodes.get(node_id)
+            if not node or node.get('type') == 'result' or node_id in visiting:
+                return 0.0
+            visiting = visiting | {node_id}
+            probabilities = self.answer_probabilities(node_id)
+            result = 1.0 + sum(p * depth(self._child(node, a), visiting)
+                               for a, p in probabilities.items())
+            memo[node_id] = result
+            return result
+
+        return depth(tree['root'], frozenset())
+
+    def find_chains(self):
+        """Find runs of boolean checks whose order does not affect the result
+
+        An OR chain is a run linked by "no" where every "yes" goes to the same
+        node; an AND chain is a run linked by "yes" where every "no" goes to the
+        same node. Only the head of a run may be referenced from elsewhere.
+        """
+        nodes = self.decision_tree['nodes']
+        parents = self._parent_counts()
+        chains = []
+        claimed = set()
+
+        for node_id in self._walk_order():
+            if node_id in claimed or nodes[node_id].get('type') != 'boolean':
+                continue
+            best = None
+            for kind, link, shared in (('OR', 'no', 'yes'), ('AND', 'yes', 'no')):
+                members = [node_id]
+                target = nodes[node_id].get(shared)
+                current = nodes[node_id].get(link)
+                while (current in nodes and current not in claimed and current not in members
+                       and nodes[current].get('type') == 'boolean'
+                       and parents.get(current, 0) == 1
+                       and nodes[current].get(shared) == target):
+                    members.append(current)
+                    current = nodes[current].get(link)
+                if len(members) > 1 and (best is None or len(members) > len(best['members'])):
+                    best = {
+                        'kind': kind,
+                        'members': members,
+                        'target': target,
+                        'exit': nodes[members[-1]].get(link)
+                    }
+            if best:
+                chains.append(best)
+                claimed.update(best['members'])
+
+        return chains
+
+    def optimize(self):
+        """Return a new decision tree with every chain reordered"""
+        tree = copy.deepcopy(self.decision_tree)
+        nodes = tree['nodes']
+        chains = self.find_chains()
+
+        # A check ends the chain early with its "stop" answer; ask likely stoppers first
+        orders = []
+        new_heads = {}
+        for chain in chains:
+            stop_answer = 'yes' if chain['kind'] == 'OR' else 'no'
+            ordered = sorted(chain['members'],
+                             key=lambda n: -self.answer_probabilities(n)[stop_answer])
+            orders.append(ordered)
+            new_heads[chain['members'][0]] = ordered[0]
+
+        # Re-point every reference to an old chain head at its new head
+        tree['root'] = new_heads.get(tree['root'], tree['root'])
+        for node in nodes.values():
+            for answer in self._answers(node):
+                child = self._child(node, answer)
+                if child in new_heads:
+                    self._set_child(node, answer, new_heads[child])
+
+        # Rewire each chain in its new order
+        for chain, ordered in zip(chains, orders):
+            link, shared = ('no', 'yes') if chain['kind'] == 'OR' else ('yes', 'no')
+            target = new_heads.get(chain['target'], chain['target'])
+            exit_node = new_heads.get(chain['exit'], chain['exit'])
+            for i, node_id in enumerate(ordered):
+                nodes[node_id][shared] = target
+                nodes[node_id][link] = ordered[i + 1] if i + 1 < len(ordered) else exit_node
+
+        return tree
+
+    def verify(self, optimized_tree):
+        """Check that every answer vector reaches the same result in both trees
+
+        Walks both trees together, only branching on answers the walk actually
+        needs, so the check stays proportional to the number of paths.
+        Returns a list of counterexamples (empty when equivalent).
+        """
+        original_nodes = self.decision_tree['nodes']
+        optimized_nodes = optimized_tree['nodes']
+        mismatches = []
+
+        def walk(nodes, node_id, assignment):
+            # Follow assigned answers; return (result id, None) or (None, unanswered node)
+            seen = set()
+            while node_id in nodes and node_id not in seen:
+                seen.add(node_id)
+                node = nodes[node_id]
+                if node.get('type') == 'result':
+                    return node_id, None
+                if node_id not in assignment:
+                    return None, node_id
+                node_id = self._child(node, assignment[node_id])
+            return node_id, None
+
+        def explore(assignment):
+            original_result, pending = walk(original_nodes, self.decision_tree['root'], assignment)
+            if pending is None:
+                optimized_result, pending = walk(optimized_nodes, optimized_tree['root'], assignment)
+                if pending is None:
+                    if optimized_result != original_result:
+                        mismatches.append({
+                            'answers': dict(assignment),
+                            'original': original_result,
+                            'optimized': optimized_result
+                        })
+                    return
+            node = original_nodes.get(pending) or optimized_nodes[pending]
+            for answer in self._answers(node):
+                assignment[pending] = answer
+                explore(assignment)
+                del assignment[pending]
+
+        explore({})
+        return mismatches
+
+    def _answers(self, node):
+        if node.get('type') == 'multiple_choice':
+            return [option['value'] for option in node.get('options', [])]
+        if node.get('type') == 'boolean':
+            return ['yes', 'no']
+        return []
+
+    def _child(self, node, answer):
+        if node.get('type') == 'multiple_choice':
+            for option in node.get('options', []):
+                if option['value'] == answer:
+                    return option.get('next')
+            return None
+        return node.get(answer)
+
+    def _set_child(self, node, answer, child):
+        if node.get('type') == 'multiple_choice':
+            for option in node.get('options', []):
+                if option['value'] == answer:
+                    option['next'] = child
+        else:
+            node[answer] = child
+
+    def _parent_counts(self):
+        nodes = self.decision_tree['nodes']
+        counts = {self.decision_tree['root']: 1}
+        for node in nodes.values():
+            for answer in self._answers(node):
+                child = self._child(node, answer)
+                if child:
+                    counts[child] = counts.get(child, 0) + 1
+        return counts
+
+    def _walk_order(self):
+        # Breadth-first from the root so chain heads are seen before their members
+        nodes = self.decision_tree['nodes']
+        order = []
+        queue = [self.decision_tree['root']]
+        seen = set()
+        while queue:
+            node_id = queue.pop(0)
+            if node_id in seen or node_id not in nodes:
+                continue
+            seen.add(node_id)
+            order.append(node_id)
+            node = nodes[node_id]
+            queue.extend(self._child(node, a) for a in self._answers(node))
+        return order
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Reorder independent decision tree checks')
+    parser.add_argument('rules_file', help='Decision tree file, e.g. e_visa_rules.json')
+    parser.add_argument('--frequencies', help='JSON file of answer counts per node')
+    parser.add_argument('--output', help='Where to write the optimized tree file')
+    parser.add_argument('--report', help='Where to write the JSON report')
+    args = parser.parse_args(argv)
+
+    with open(args.rules_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    frequencies = {}
+    if args.frequencies:
+        with open(args.frequencies, 'r', encoding='utf-8') as f:
+            frequencies = json.load(f)
+
+    optimizer = DecisionTreeOptimizer(data['decision_tree'], frequencies)
+    optimized_tree = optimizer.optimize()
+    mismatches = optimizer.verify(optimized_tree)
+
+    report = {
+        'rules_file': args.rules_file,
+        'expected_depth_before': optimizer.expected_depth(),
+        'expected_depth_after': optimizer.expected_depth(optimized_tree),
+        'chains': optimizer.find_chains(),
+        'root_before': data['decision_tree']['root'],
+        'root_after': optimized_tree['root'],
+        'equivalent': not mismatches,
+        'mismatches': mismatches[:10]
+    }
+
+    print(f"Expected depth: {report['expected_depth_before']:.3f} -> {report['expected_depth_after']:.3f}")
+    print(f"Reorderable chains: {len(report['chains'])}")
+    print(f"Equivalent: {report['equivalent']}")
+
+    if mismatches:
+        print("Error: optimized tree changes results, not writing output")
+        return 1
+
+    if args.output:
+        optimized = dict(data)
+        optimized['decision_tree'] = optimized_tree
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(optimized, f, ensure_ascii=False, indent=2)
+        print(f"Optimized tree written to {args.output}")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Report written to {args.report}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
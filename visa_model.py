@@ -0,0 +1,247 @@
+"""
+Compact Rule and Decision Tree Model
+Immutable, __slots__-backed records for rules.json and the E/L/B trees.
+
+Records keep one small fixed-size object per question, rule and node, with
+interned ids, tuples instead of lists, and decision tree nodes stored in a
+single tuple indexed by position. Loaded once in the gunicorn master
+(see gunicorn.conf.py) the model is shared copy-on-write by every worker.
+
+Records also allow read-only dict-style access (record['id'],
+record.get('options')) so engine code can treat them like the JSON they
+were loaded from; use as_dict() to get plain JSON back for responses.
+Keys a record class doesn't know are kept read-only alongside the fixed
+fields, and an explicit JSON null stays distinct from an absent key.
+"""
+
+import json
+import sys
+from collections.abc import Mapping
+from types import MappingProxyType
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class _Absent:
+    """Slot value for a key the JSON didn't have (None is a real JSON null)"""
+    __slots__ = ()
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return '<absent>'
+
+
+_ABSENT = _Absent()
+_NO_EXTRA = MappingProxyType({})
+
+
+class FrozenRecord:
+    """Immutable record with read-only dict-style access to its fields"""
+    __slots__ = ('_extra',)
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            object.__setattr__(self, name, fields.pop(name, _ABSENT))
+        object.__setattr__(self, '_extra', MappingProxyType(fields) if fields else _NO_EXTRA)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def _items(self):
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if value is not _ABSENT:
+                yield name, value
+        yield from self._extra.items()
+
+    def __getitem__(self, key):
+        value = getattr(self, key) if key in self.__slots__ else self._extra.get(key, _ABSENT)
+        if value is _ABSENT:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        if key in self.__slots__:
+            return getattr(self, key) is not _ABSENT
+        return key in self._extra
+
+    def get(self, key, default=None):
+        value = getattr(self, key) if key in self.__slots__ else self._extra.get(key, _ABSENT)
+        return default if value is _ABSENT else value
+
+    def as_dict(self):
+        """Convert back to the plain JSON layout (absent fields are omitted)"""
+        return {name: _to_json(value) for name, value in self._items()}
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={value!r}' for name, value in self._items())
+        return f'{type(self).__name__}({fields})'
+
+
+def _to_json(value):
+    if isinstance(value, FrozenRecord):
+        return value.as_dict()
+    if isinstance(value, tuple):
+        return [_to_json(v) for v in value]
+    return value
+
+
+class VisaType(FrozenRecord):
+    __slots__ = ('name', 'description', 'color', 'requirements')
+
+
+class QuestionOption(FrozenRecord):
+    __slots__ = ('value', 'text', 'visa_types')
+
+
+class Question(FrozenRecord):
+    __slots__ = ('id', 'text', 'type', 'condition_id', 'visa_types', 'is_screening', 'options', 'note')
+
+
+class Condition(FrozenRecord):
+    __slots__ = ('type', 'conditions')
+
+
+class Rule(FrozenRecord):
+    __slots__ = ('id', 'description', 'conditions', 'conclusion')
+
+
+class TreeOption(FrozenRecord):
+    __slots__ = ('value', 'text', 'next')
+
+
+class TreeNode(FrozenRecord):
+    __slots__ = ('id', 'type', 'question', 'yes', 'no', 'options',
+                 'decision', 'title', 'message', 'next_steps', 'alternatives')
+
+
+class NodeMap(Mapping):
+    """Read-only node_id -> TreeNode view over a DecisionTree's node array"""
+    __slots__ = ('_tree',)
+
+    def __init__(self, tree):
+        self._tree = tree
+
+    def __getitem__(self, node_id):
+        return self._tree.nodes[self._tree.index[node_id]]
+
+    def __contains__(self, node_id):
+        return node_id in self._tree.index
+
+    def get(self, node_id, default=None):
+        position = self._tree.index.get(node_id)
+        return default if position is None else self._tree.nodes[position]
+
+    def __iter__(self):
+        return (node.id for node in self._tree.nodes)
+
+    def __len__(self):
+        return len(self._tree.nodes)
+
+
+class DecisionTree(FrozenRecord):
+    __slots__ = ('root', 'nodes', 'index')
+
+    def __getitem__(self, key):
+        # Keep the {'root': ..., 'nodes': {...}} JSON shape for callers
+        if key == 'nodes':
+            return NodeMap(self)
+        return super().__getitem__(key)
+
+    def as_dict(self):
+        nodes = {}
+        for node in self.nodes:
+            data = node.as_dict()
+            del data['id']
+            nodes[node.id] = data
+        return {'root': self.root, 'nodes': nodes}
+
+
+class RuleBase(FrozenRecord):
+    __slots__ = ('visa_types', 'questions', 'rules', 'priors')
+
+
+def _build_condition(condition):
+    if isinstance(condition, str):
+        return sys.intern(condition)
+    return Condition(type=sys.intern(condition['type']),
+                     conditions=tuple(_build_condition(c) for c in condition['conditions']))
+
+
+def _build_question(data):
+    fields = dict(data)
+    for key in ('id', 'type', 'condition_id'):
+        if key in fields:
+            fields[key] = _intern(fields[key])
+    if fields.get('visa_types') is not None:
+        fields['visa_types'] = tuple(_intern(v) for v in fields['visa_types'])
+    if fields.get('options') is not None:
+        fields['options'] = tuple(_build_question_option(o) for o in fields['options'])
+    return Question(**fields)
+
+
+def _build_question_option(data):
+    fields = dict(data)
+    fields['value'] = _intern(fields['value'])
+    if fields.get('visa_types') is not None:
+        fields['visa_types'] = tuple(_intern(v) for v in fields['visa_types'])
+    return QuestionOption(**fields)
+
+
+def _build_tree_option(data):
+    fields = dict(data)
+    for key in ('value', 'next'):
+        if key in fields:
+            fields[key] = _intern(fields[key])
+    return TreeOption(**fields)
+
+
+def _build_node(node_id, data):
+    fields = dict(data)
+    fields['id'] = sys.intern(node_id)
+    for key in ('type', 'yes', 'no', 'decision'):
+        if key in fields:
+            fields[key] = _intern(fields[key])
+    for key in ('next_steps', 'alternatives'):
+        if fields.get(key) is not None:
+            fields[key] = tuple(fields[key])
+    if fields.get('options') is not None:
+        fields['options'] = tuple(_build_tree_option(o) for o in fields['options'])
+    return TreeNode(**fields)
+
+
+def load_rule_base(rules_file):
+    """Load rules.json into an immutable RuleBase"""
+    with open(rules_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    return RuleBase(
+        visa_types=MappingProxyType({sys.intern(k): VisaType(**v) for k, v in data['visa_types'].items()}),
+        questions=tuple(_build_question(q) for q in data['questions']),
+        rules=tuple(Rule(**{**r, 'conditions': _build_condition(r['conditions']),
+                            'conclusion': sys.intern(r['conclusion'])})
+                    for r in data['rules']),
+        priors=MappingProxyType(dict(data.get('priors', {})))
+    )
+
+
+def load_decision_tree(rules_file):
+    """Load an E/L/B tree file into (VisaType, DecisionTree)"""
+    with open(rules_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    tree = data['decision_tree']
+    nodes = tuple(_build_node(node_id, node) for node_id, node in tree['nodes'].items())
+    decision_tree = DecisionTree(
+        root=sys.intern(tree['root']),
+        nodes=nodes,
+        index=MappingProxyType({node.id: position for position, node in enumerate(nodes)})
+    )
+    return VisaType(**data['visa_type']), decision_tree